@@ -25,6 +25,9 @@ from typing import Any, Type
 class Asset:
     """Asset class"""
 
+    __slots__ = ("name", "source", "checksum", "filename", "test_time",
+                 "path")
+
     def __init__(
             self,
             name: str,
@@ -40,6 +43,7 @@ class Asset:
 
         # Not in JSON
         self.test_time = 0.0
+        self.path = ""
 
     @classmethod
     def from_json(cls: Type["Asset"], data: Any) -> Any:
@@ -19,20 +19,42 @@
 
 """Module to handle an asset list"""
 
+import hashlib
 import json
 import os
+import pickle
 import sys
 import urllib.error
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from multiprocessing import Pool
-from typing import Any, Dict, List, Type
-
-from .utils import NamedClass, file_checksum, download
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from .utils import (
+    NamedClass,
+    ChecksumCache,
+    cache_dir,
+    parse_checksum,
+    download_and_hash,
+    new_hash,
+)
 from .asset import Asset
 
+CHECKSUMS_CACHE = ".soothe_checksums.json"
+# Bump it whenever Content or Asset change their pickled layout
+CONTENT_CACHE_VERSION = 3
+
+
+class DownloadError(RuntimeError):
+    """Error downloading or verifying an asset"""
+
+    def __reduce__(self) -> Any:
+        # Keep only the message so it can be pickled even if the cause
+        # holds unpicklable objects, such as an open HTTP response
+        return (type(self), self.args)
+
 
-@dataclass
+@dataclass(slots=True)
 class DownloadWork:
     """Context to pass to each download worker"""
     out_dir: str
@@ -40,9 +62,10 @@ class DownloadWork:
     asset_list_name: str
     retries: int
     asset: Asset
+    checksums: ChecksumCache
 
 
-@dataclass
+@dataclass(slots=True)
 class Content:
     """Class for keeping track of an asset list"""
     name: str
@@ -71,10 +94,67 @@ class AssetList(NamedClass):
             resources_dir: str
     ) -> "AssetList":
         """Create an AssetList instance from a file"""
+        # The key is taken before reading the file, so if it changes
+        # meanwhile the cached content doesn't pass for the new version
+        try:
+            cache: Optional[Tuple[str, Any]] = cls._content_cache_key(filename)
+        except OSError:
+            cache = None
+        content = cls._load_cached_content(cache) if cache else None
+        if content:
+            return cls(filename, resources_dir, content)
         with open(filename, encoding="utf-8") as json_file:
             data = json.load(json_file)
             data["assets"] = dict(map(Asset.from_json, data["assets"]))
-            return cls(filename, resources_dir, Content(**data))
+            content = Content(**data)
+        if cache:
+            cls._store_cached_content(cache, content)
+        return cls(filename, resources_dir, content)
+
+    @staticmethod
+    def _content_cache_key(filename: str) -> Tuple[str, Any]:
+        """Return the cache file of an asset list file and the key that
+        identifies its current version"""
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        cache_file = os.path.join(
+            cache_dir(),
+            f'assetlist-{hashlib.sha1(path.encode()).hexdigest()}.pkl'
+        )
+        return (cache_file, (CONTENT_CACHE_VERSION, path, stat.st_mtime_ns,
+                             stat.st_size))
+
+    @staticmethod
+    def _load_cached_content(cache: Tuple[str, Any]) -> Optional[Content]:
+        """Return the cached parsed content of an asset list if the file
+        hasn't changed since then"""
+        (cache_file, key) = cache
+        try:
+            with open(cache_file, 'rb') as f:
+                (cached_key, content) = pickle.load(f)
+        except (OSError, EOFError, AttributeError, TypeError, ValueError,
+                pickle.PickleError):
+            return None
+        if cached_key != key or not isinstance(content, Content):
+            return None
+        return content
+
+    @staticmethod
+    def _store_cached_content(
+            cache: Tuple[str, Any],
+            content: Content,
+    ) -> None:
+        """Cache the parsed content of an asset list, ignoring any failure"""
+        (cache_file, key) = cache
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+            with open(tmp_file, 'wb') as f:
+                pickle.dump((key, content), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except (OSError, pickle.PickleError):
+            pass
 
     @staticmethod
     def _download_worker(ctx: DownloadWork) -> None:
@@ -84,38 +164,38 @@ class AssetList(NamedClass):
         if not os.path.exists(dest_dir):
             os.makedirs(dest_dir, exist_ok=True)
         dest_path = os.path.join(dest_dir, os.path.basename(asset.source))
+        (algo, digest) = parse_checksum(asset.checksum)
+        try:
+            new_hash(algo)
+        except ValueError as ex:
+            raise DownloadError(
+                f"Unable to check test vector '{asset.name}': "
+                f"{str(ex)}") from ex
         if ctx.verify and os.path.exists(dest_path):
-            checksum = file_checksum(dest_path)
-            if checksum == asset.checksum:
+            checksum = ctx.checksums.checksum(dest_path, algo)
+            if checksum == digest:
                 return
         print(f'\tDownloading asset {asset.name} to {dest_dir}')
-        # Catch the exception that download may throw to make sure pickle can
-        # serialize it properly
-        # This avoids:
-        # Error sending result: '<multiprocessing.pool.ExceptionWithTraceback>'
-        # Reason: 'TypeError("cannot pickle '_io.BufferedReader' object")'
-        for i in range(ctx.retries):
+        retries = max(1, ctx.retries)
+        for i in range(retries):
             try:
-                exception_str = ""
-                download(asset.source, dest_dir)
+                checksum = download_and_hash(asset.source, dest_path, algo)
             except urllib.error.URLError as ex:
-                exception_str = f'Unable to download {asset.source} to '\
-                    f'{dest_dir}: {str(ex)} (retry count={i + 1})'
-                continue
+                if i < retries - 1:
+                    continue
+                raise DownloadError(
+                    f'Unable to download {asset.source} to {dest_dir}: '
+                    f'{str(ex)} (retry count={i + 1})') from ex
             except OSError as ex:
-                raise RuntimeError(f'Unable to store {asset.source} to '
-                                   f'{dest_dir}: {str(ex)}') from ex
+                raise DownloadError(f'Unable to store {asset.source} to '
+                                    f'{dest_dir}: {str(ex)}') from ex
             break
 
-        if exception_str:
-            raise RuntimeError(exception_str)
-
-        if asset.checksum != "__skip__":
-            checksum = file_checksum(dest_path)
-            if asset.checksum != checksum:
-                raise RuntimeError(
-                    f"Checksum error for test vector '{asset.name}': "
-                    f"'{checksum}' instead of '{asset.checksum}'")
+        ctx.checksums.update(dest_path, checksum, algo)
+        if asset.checksum != "__skip__" and checksum != digest:
+            raise DownloadError(
+                f"Checksum error for test vector '{asset.name}': "
+                f"'{checksum}' instead of '{digest}'")
 
     def assets(self) -> List[Asset]:
         """Return the list of assets contained"""
@@ -134,37 +214,37 @@ class AssetList(NamedClass):
     ) -> None:
         """Download the asset list"""
         os.makedirs(os.path.join(out_dir, self.content.name), exist_ok=True)
+        checksums = ChecksumCache(os.path.join(out_dir, CHECKSUMS_CACHE))
 
-        with Pool(jobs) as pool:
-
-            def _callback_error(err: Any) -> None:
-                print(f'Error downloading: {err}')
-
-            downloads = []
-
+        # Downloads are I/O bound, so threads are enough and there is no need
+        # to pickle the work context to worker processes
+        failed = False
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
             print(f'Downloading test suite {self.content.name} use {jobs} '
                   f'parallel jobs')
-            for asset in self.assets():
-                dwork = DownloadWork(
-                    out_dir,
-                    verify,
-                    self.content.name,
-                    retries,
-                    asset
-                )
-                downloads.append(
-                    pool.apply_async(
-                        self._download_worker,
-                        args=(dwork,),
-                        error_callback=_callback_error,
+            downloads = [
+                executor.submit(
+                    self._download_worker,
+                    DownloadWork(
+                        out_dir,
+                        verify,
+                        self.content.name,
+                        retries,
+                        asset,
+                        checksums,
                     )
                 )
-            pool.close()
-            pool.join()
-
-        for job in downloads:
-            if not job.successful():
-                sys.exit("Some download failed")
+                for asset in self.assets()
+            ]
+            for job in as_completed(downloads):
+                err = job.exception()
+                if err:
+                    print(f'Error downloading: {err}', flush=True)
+                    failed = True
+        checksums.save()
+
+        if failed:
+            sys.exit("Some download failed")
 
         print('All downloads finished')
 
@@ -20,9 +20,10 @@
 """Module with the encoder abstract class and the list of available encoders"""
 
 from abc import abstractmethod
-from functools import lru_cache
+from functools import cache
 from shutil import which
-from typing import List, Type
+from typing import List, Tuple, Type
+from weakref import WeakKeyDictionary
 
 from .codec import Codec
 from .utils import NamedClass, normalize_binary_cmd
@@ -36,6 +37,8 @@ class Encoder(NamedClass):
     hw_acceleration: bool = False
     description: str = ""
     binary: str = ""
+    # Whether encode_cmd() is implemented
+    supports_stdout: bool = False
 
     def __init__(self) -> None:
         if self.binary:
@@ -52,15 +55,31 @@ class Encoder(NamedClass):
         """Encodes input_file in output_file"""
         raise NotImplementedError
 
-    @lru_cache(maxsize=128)
+    def encode_cmd(self, input_file: str) -> List[str]:
+        """Command that encodes input_file writing the result, as y4m, to its
+        stdout, so it can be piped to VMAF. Only for encoders that
+        supports_stdout"""
+        raise TypeError(f'{self.name()} cannot encode to stdout')
+
     def check(self, verbose: bool) -> bool:
         """Checks whether the encoder can be ran"""
-        if hasattr(self, "binary") and self.binary:
-            path = which(self.binary)
-            if verbose and not path:
-                print(f'{self.binary} cannot be found in path')
-            return path is not None
-        return True
+        result = CHECK_RESULTS.get(self)
+        if result is None:
+            result = CHECK_RESULTS[self] = self._check_impl()
+        (can_run, reason) = result
+        if verbose and not can_run:
+            print(f'{self.name()} cannot be run')
+            if reason:
+                print(reason)
+        return can_run
+
+    def _check_impl(self) -> Tuple[bool, str]:
+        """Checks whether the encoder can be ran, and why not otherwise. Its
+        result is cached by check(), so it shouldn't depend on the
+        verbosity"""
+        if self.binary and which(self.binary) is None:
+            return (False, f'{self.binary} cannot be found in path')
+        return (True, '')
 
     def name(self) -> str:
         """Encoder's name"""
@@ -70,11 +89,24 @@ class Encoder(NamedClass):
         return f'{self.encoder_name}: {self.description}'
 
 
-ENCODERS: List[Encoder] = []
+ENCODERS: List[Type[Encoder]] = []
+
+# Result of Encoder.check() per encoder instance
+CHECK_RESULTS: "WeakKeyDictionary[Encoder, Tuple[bool, str]]" = \
+    WeakKeyDictionary()
 
 
 def register_encoder(cls: Type[Encoder]) -> Type[Encoder]:
     """Register a new decoder implementation"""
-    ENCODERS.append(cls())
-    ENCODERS.sort(key=lambda enc: enc.encoder_name)
+    if cls not in ENCODERS:
+        ENCODERS.append(cls)
+        encoders.cache_clear()
     return cls
+
+
+@cache
+def encoders() -> List[Encoder]:
+    """Return the instances of the registered encoders sorted by name.
+    Encoders are instantiated on first use rather than when registered"""
+    return sorted((cls() for cls in ENCODERS),
+                  key=lambda enc: enc.encoder_name)
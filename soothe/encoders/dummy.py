@@ -19,10 +19,9 @@
 
 """Module for dummy encoder"""
 
-import shutil
-
 from ..codec import Codec
 from ..encoder import Encoder, register_encoder
+from ..utils import copy_file
 
 
 @register_encoder
@@ -42,4 +41,4 @@ class Dummy(Encoder):
     ):
         """Copies input_file to output_file"""
 
-        shutil.copyfile(input_file, output_file)
+        copy_file(input_file, output_file)
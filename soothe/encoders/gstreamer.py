@@ -23,16 +23,12 @@
 import shlex
 import subprocess
 
-from functools import lru_cache
+from typing import List, Tuple
 
 from ..codec import Codec
 from ..encoder import Encoder, register_encoder
-from ..utils import normalize_binary_cmd, run_command
-
-PIPELINE_TPL = "{} --eos-on-shutdown --no-fault filesrc location={} ! "\
-    "y4mdec ! videoconvert dither=none ! "\
-    "{} ! decodebin ! "\
-    "videoconvert dither=none ! y4menc ! filesink location={}"
+from ..utils import (resolve_binary_cmd, run_command,
+                     run_command_with_output)
 
 
 class GStreamer(Encoder):
@@ -43,6 +39,7 @@ class GStreamer(Encoder):
     api: str
     provider = 'GStreamer'
     variant: str
+    supports_stdout = True
 
     def __init__(self) -> None:
         super().__init__()
@@ -50,36 +47,57 @@ class GStreamer(Encoder):
             f'{self.variant}-{self.api}-Gst1.0'
         self.description = f'{self.provider} {self.codec.value} '\
             f'{self.variant} {self.api} encoder for GStreamer 1.0'
-        self.cmd = normalize_binary_cmd('gst-launch-1.0')
+        self.cmd = resolve_binary_cmd('gst-launch-1.0')
+        # The pipeline only changes in the file locations, so tokenize the
+        # rest of it once
+        self._pipeline_head = [
+            self.cmd, '--eos-on-shutdown', '--no-fault', 'filesrc'
+        ]
+        self._pipeline_tail = [
+            '!', 'y4mdec', '!', 'videoconvert', 'dither=none', '!',
+            *shlex.split(self.encoder_bin), '!', 'decodebin', '!',
+            'videoconvert', 'dither=none', '!', 'y4menc', '!',
+        ]
 
     def _construct_pipeline(
             self,
             input_file: str,
             output_file: str,
-    ) -> str:
+    ) -> List[str]:
         """Generate the GStreamer pipeline used to encode the asset"""
-        return PIPELINE_TPL.format(
+        return [
+            *self._pipeline_head,
+            f'location={input_file}',
+            *self._pipeline_tail,
+            'filesink',
+            f'location={output_file}',
+        ]
+
+    def encode_cmd(self, input_file: str) -> List[str]:
+        """Generate the GStreamer pipeline that encodes the asset to stdout"""
+        # Quiet, so gst-launch messages don't get mixed with the stream
+        return [
             self.cmd,
-            input_file,
-            self.encoder_bin,
-            output_file
-        )
-
-    @lru_cache(maxsize=128)
-    def check(self, verbose: bool) -> bool:
+            '-q',
+            *self._pipeline_head[1:],
+            f'location={input_file}',
+            *self._pipeline_tail,
+            'fdsink',
+        ]
+
+    def _check_impl(self) -> Tuple[bool, str]:
         """Check if GStreamer decoder is valid (better than gst-inspect)"""
         try:
-            binary = normalize_binary_cmd('gst-launch-1.0')
-            pipeline = f"{binary} --no-fault "\
+            pipeline = f"{self.cmd} --no-fault "\
                 f"appsrc num-buffers=0 ! {self.encoder_bin} ! fakesink"
-            run_command(shlex.split(pipeline), verbose=verbose)
+            run_command_with_output(shlex.split(pipeline))
         except FileNotFoundError as e:
             print("Executable not found:", e)
-            return False
+            return (False, '')
         except subprocess.CalledProcessError as e:
             print("Process failed:", e)
-            return False
-        return True
+            return (False, e.output)
+        return (True, '')
 
     def encode(
             self,
@@ -91,7 +109,7 @@ class GStreamer(Encoder):
         """Encodes input_file in output_file"""
 
         pipeline = self._construct_pipeline(input_file, output_file)
-        run_command(shlex.split(pipeline), timeout=timeout, verbose=verbose)
+        run_command(pipeline, timeout=timeout, verbose=verbose)
 
 
 @register_encoder
@@ -21,16 +21,39 @@
 
 """Module for Vulkan Video Samples based encoders"""
 
-import shlex
 import subprocess
 
-from functools import lru_cache
+from functools import cache
+from typing import List, Tuple
 
 from ..codec import Codec
 from ..encoder import Encoder, register_encoder
-from ..utils import normalize_binary_cmd, run_command
-
-VKVS_TPL = "{} -c {} -i {} -o {} --profile {}"
+from ..utils import (resolve_binary_cmd, run_command,
+                     run_command_with_output)
+
+# Codec names as expected by the -c option
+CODEC_NAMES = {
+    Codec.H264: 'h264',
+    Codec.H265: 'h265',
+    Codec.AV1: 'av1',
+}
+
+
+@cache
+def _probe_binary(cmd: str) -> Tuple[bool, str]:
+    """Check if the VKVS binary can be ran, and why not otherwise. All the
+    VKVS encoders share the same binary, so it's probed only once per
+    process: the cache is global on purpose and, being keyed on the path,
+    keeps no encoder alive"""
+    try:
+        run_command_with_output([cmd, '--help'])
+    except FileNotFoundError as e:
+        print("Executable not found:", e)
+        return (False, '')
+    except subprocess.CalledProcessError as e:
+        print("Process failed:", e)
+        return (False, e.output)
+    return (True, '')
 
 
 class VKVS(Encoder):
@@ -46,45 +69,32 @@ class VKVS(Encoder):
             f'{self.variant}'
         self.description = f'{self.provider} {self.codec.value}'\
             f' {self.variant} encoder'
-        self.cmd = normalize_binary_cmd('vk-video-enc-test')
+        self.cmd = resolve_binary_cmd('vk-video-enc-test')
+        self._codec_str = self.codec_name(self.codec)
+        # Only the file names change between encodes
+        self._cmd_head = [self.cmd, '-c', self._codec_str]
+        self._cmd_tail = ['--profile', self.variant]
 
     def codec_name(self, codec: Codec) -> str:
         """Generate the codec name"""
-        if codec == Codec.H264:
-            return 'h264'
-        if codec == Codec.H265:
-            return 'h265'
-        if codec == Codec.AV1:
-            return 'av1'
-        return 'unknown'
+        return CODEC_NAMES.get(codec, 'unknown')
 
     def _construct_cmd(
             self,
             input_file: str,
             output_file: str,
-    ) -> str:
+    ) -> List[str]:
         """Generate the VKVS command used to encode the asset"""
-        return VKVS_TPL.format(
-            self.cmd,
-            self.codec_name(self.codec),
-            input_file,
-            output_file,
-            self.variant
-        )
-
-    @lru_cache(maxsize=128)
-    def check(self, verbose: bool) -> bool:
+        return [
+            *self._cmd_head,
+            '-i', input_file,
+            '-o', output_file,
+            *self._cmd_tail,
+        ]
+
+    def _check_impl(self) -> Tuple[bool, str]:
         """Check if VKVS decoder is valid"""
-        try:
-            enc_cmd = f"{self.cmd} --help"
-            run_command(shlex.split(enc_cmd), verbose=verbose)
-        except FileNotFoundError as e:
-            print("Executable not found:", e)
-            return False
-        except subprocess.CalledProcessError as e:
-            print("Process failed:", e)
-            return False
-        return True
+        return _probe_binary(self.cmd)
 
     def encode(
             self,
@@ -95,7 +105,7 @@ class VKVS(Encoder):
     ):
         """Encodes input_file in output_file"""
         enc_cmd = self._construct_cmd(input_file, output_file)
-        run_command(shlex.split(enc_cmd), timeout=timeout, verbose=verbose)
+        run_command(enc_cmd, timeout=timeout, verbose=verbose)
 
 
 @register_encoder
@@ -20,14 +20,15 @@
 """CLI handler for Soothe"""
 
 import argparse
-import multiprocessing
 import os
 import sys
 
+from functools import cached_property
 from typing import Any
 from tempfile import gettempdir
 
 from .soothe import RunParams, Soothe
+from .utils import cpu_count
 
 APPNAME = "soothe"
 ASSETS_DIR = "assets"
@@ -52,7 +53,10 @@ class Main:  # pylint: disable=too-few-public-methods
                                           RESOURCES_DIR)
         self.output_dir = os.path.join(gettempdir(), OUTPUT_DIR)
 
-        self.args = self._create_argument_parser()
+    @cached_property
+    def args(self) -> argparse.ArgumentParser:
+        """Argument parser, only built when it's needed"""
+        return self._create_argument_parser()
 
     def run(self) -> None:
         """Run Soothe"""
@@ -148,7 +152,6 @@ class Main:  # pylint: disable=too-few-public-methods
             help='number of parallel jobs to use. 1x logical cores by default.'
             '0 means all logical cores',
             type=int,
-            default=multiprocessing.cpu_count(),
         )
         subparser.add_argument(
             '-t',
@@ -250,7 +253,6 @@ class Main:  # pylint: disable=too-few-public-methods
             help='number of parallel jobs to use. 2x logical cores by default'
             '0 means all logical cores',
             type=int,
-            default=2 * multiprocessing.cpu_count(),
         )
         subparser.add_argument(
             '-r',
@@ -276,7 +278,10 @@ class Main:  # pylint: disable=too-few-public-methods
 
     @staticmethod
     def _run_cmd(args: Any, soothe: Soothe) -> None:
-        args.jobs = args.jobs if args.jobs > 0 else multiprocessing.cpu_count()
+        # Defaults depending on the CPU count are resolved here so building
+        # the parser doesn't need to query it
+        if args.jobs is None or args.jobs <= 0:
+            args.jobs = cpu_count()
         params = RunParams(
             jobs=args.jobs,
             asset_lists_names=args.asset_lists,
@@ -301,7 +306,10 @@ class Main:  # pylint: disable=too-few-public-methods
 
     @staticmethod
     def _download_cmd(args: Any, soothe: Soothe) -> None:
-        args.jobs = args.jobs if args.jobs > 0 else multiprocessing.cpu_count()
+        if args.jobs is None:
+            args.jobs = 2 * cpu_count()
+        elif args.jobs <= 0:
+            args.jobs = cpu_count()
         soothe.download_assets(
             asset_lists=args.asset_lists,
             jobs=args.jobs,
@@ -21,17 +21,17 @@
 
 import os
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from functools import lru_cache
 from pathlib import Path
 from shutil import which
-from typing import Iterator, List, Optional, Tuple
+from typing import Iterator, List, Optional, Set, Tuple
 
 from .asset import Asset
 from .asset_list import AssetList
-from .encoder import ENCODERS
+from .encoder import encoders as registered_encoders
 from .test_suite import TestSuite, Params as TestSuiteParams
-from .utils import get_matches_from_list
+from .utils import get_matches_from_list, normalize_path
 
 # Import decoders that will auto-register
 from .encoders import *  # noqa: F401,F403,E501 pylint: disable=wildcard-import disable=unused-wildcard-import
@@ -81,7 +81,7 @@ class RunParams:  # pylint: disable=too-many-instance-attributes
         )
 
 
-class Soothe:
+class Soothe:  # pylint: disable=too-many-instance-attributes
     """Main class for soothe"""
 
     def __init__(
@@ -95,6 +95,8 @@ class Soothe:
         self.resources_dir = resources_dir
         self.output_dir = output_dir
         self.asset_lists: List[AssetList] = []
+        self._asset_lists_names: Set[str] = set()
+        self._asset_lists_loaded = False
         self.verbose = verbose
         self.vmaf_binary: Optional[Path] = None
         if self.verbose:
@@ -117,29 +119,50 @@ class Soothe:
 
         return False
 
-    def _walk_assets_dir(self) -> Iterator[Tuple[str, List[str], List[str]]]:
+    @classmethod
+    def _scan_asset_lists_files(cls, path: str) -> Iterator[str]:
+        """Yield the JSON files found recursively in path"""
+        dirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif entry.name.endswith('.json') and entry.is_file():
+                        yield entry.path
+        except OSError:
+            return
+        for dir_path in dirs:
+            yield from cls._scan_asset_lists_files(dir_path)
+
+    def _walk_assets_dir(self) -> Iterator[str]:
         for asset_dir in self.assets_dir.split(os.pathsep):
-            for root, dirnames, files in os.walk(asset_dir):
-                yield (root, dirnames, files)
+            yield from self._scan_asset_lists_files(asset_dir)
 
-    @lru_cache(maxsize=128)
     def _load_asset_lists(self) -> None:
-        for root, _, files in self._walk_assets_dir():
-            for f in files:
-                if os.path.splitext(f)[1] == '.json':
-                    try:
-                        asset_list = AssetList.from_json_file(
-                            os.path.join(root, f),
-                            self.resources_dir)
-                        if asset_list.content.name in [a.content.name for a
-                                                       in self.asset_lists]:
-                            raise RuntimeError(f'Repeated asset list with '
-                                               f'"{asset_list.content.name}"')
-                        self.asset_lists.append(asset_list)
-                    except (OSError, ValueError, LookupError) as ex:
-                        print(f'Error loading asset list from {f}: {ex}')
+        if self._asset_lists_loaded:
+            return
+        paths = list(self._walk_assets_dir())
+        # Parse the files concurrently, but add them in a stable order
+        with ThreadPoolExecutor(max_workers=min(32, len(paths) or 1)) \
+                as executor:
+            loads = [executor.submit(AssetList.from_json_file, path,
+                                     self.resources_dir) for path in paths]
+        for path, load in zip(paths, loads):
+            try:
+                asset_list = load.result()
+            except (OSError, ValueError, LookupError) as ex:
+                print(f'Error loading asset list from '
+                      f'{os.path.basename(path)}: {ex}')
+                continue
+            if asset_list.content.name in self._asset_lists_names:
+                raise RuntimeError(f'Repeated asset list with '
+                                   f'"{asset_list.content.name}"')
+            self._asset_lists_names.add(asset_list.content.name)
+            self.asset_lists.append(asset_list)
         if len(self.asset_lists) == 0:
             raise RuntimeError(f'No assets found in "{self.assets_dir}"')
+        self._asset_lists_loaded = True
 
     def download_assets(
             self,
@@ -178,19 +201,27 @@ class Soothe:
             "asset lists",
         )
 
-        assets = [(asset_list.name(), asset) for asset_list in asset_lists
+        names = [asset_list.name() for asset_list in asset_lists]
+        assets = [(name, asset)
+                  for name, asset_list in zip(names, asset_lists)
                   for asset in asset_list.assets()]
         if params.assets_names:
-            assets = [asset for asset in assets
-                      if asset[1].name in params.assets_names]
+            wanted = frozenset(params.assets_names)
+            assets = [asset for asset in assets if asset[1].name in wanted]
         if params.skip_assets_names:
+            skipped = frozenset(params.skip_assets_names)
             assets = [asset for asset in assets
-                      if asset[1].name not in params.skip_assets_names]
+                      if asset[1].name not in skipped]
         if len(assets) == 0:
             raise RuntimeError('No defined assets to tests')
+        for (asset_list_name, asset) in assets:
+            asset.path = normalize_path(os.path.join(
+                self.resources_dir,
+                asset_list_name,
+                asset.filename,
+            ))
 
-        test_suite_name = '-'.join([asset_list.name()
-                                    for asset_list in asset_lists])
+        test_suite_name = '-'.join(names)
 
         return (test_suite_name, assets)
 
@@ -205,24 +236,32 @@ class Soothe:
 
         encoders = get_matches_from_list(
             params.encoders_names,
-            ENCODERS,
+            registered_encoders(),
             "encoders",
         )
         if len(encoders) == 0:
             raise RuntimeError('No encoders to test')
 
         (test_suite_name, assets) = self._generate_assets(params)
-        test_suite = TestSuite(
-            params.as_test_suite_params(
-                test_suite_name,
-                assets,
-                self.vmaf_binary,
-                self.resources_dir,
-                self.output_dir
-            )
+        test_suite_params = params.as_test_suite_params(
+            test_suite_name,
+            assets,
+            self.vmaf_binary,
+            self.resources_dir,
+            self.output_dir
         )
-        for encoder in encoders:
-            test_suite.run(encoder)
+        test_suite = TestSuite(test_suite_params)
+        # Encoders run concurrently, sharing the workers of the suite
+        executor = ThreadPoolExecutor(max_workers=len(encoders))
+        try:
+            list(executor.map(test_suite.run, encoders))
+        except BaseException:
+            # Terminate before waiting for the runs, so they stop
+            test_suite.close(terminate=True)
+            raise
+        finally:
+            executor.shutdown()
+        test_suite.close()
 
     def list_asset_lists(
             self,
@@ -232,11 +271,10 @@ class Soothe:
         """List all asset lists"""
         self._load_asset_lists()
         print('\nList of available asset lists:')
-        if asset_lists:
-            asset_lists = [x.lower() for x in asset_lists]
+        wanted = frozenset(x.lower() for x in asset_lists or ())
 
         for asset_list in self.asset_lists:
-            if asset_lists and asset_list.name().lower() not in asset_lists:
+            if wanted and asset_list.name().lower() not in wanted:
                 continue
             print(f'\t{asset_list}')
             if show_assets:
@@ -252,7 +290,7 @@ class Soothe:
     ) -> None:
         """List all the available encoders"""
         print('\nList of available encoders:')
-        for encoder in ENCODERS:
+        for encoder in registered_encoders():
             string = f'{encoder}'
             if check:
                 string += ' … ' + (
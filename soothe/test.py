@@ -20,25 +20,29 @@
 """Test module"""
 
 import os
+import re
 
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 from subprocess import TimeoutExpired
-from time import perf_counter
-from typing import Optional, Tuple
+from time import perf_counter_ns
+from typing import List, Optional
 
 from .asset import Asset
 from .encoder import Encoder
-from .utils import normalize_path, run_command_with_output
+from .utils import (normalize_path, run_command_with_output,
+                    run_piped_commands)
+
+# Pooled score printed by vmaf for its model, ie. "vmaf_v0.6.1: 95.123456"
+VMAF_SCORE_RE = re.compile(r'^[\w.-]+:\s*(\d+(?:\.\d+)?)\s*$', re.MULTILINE)
 
 
 @dataclass
 class Params:  # pylint: disable=too-many-instance-attributes
-    """Params for a test"""
+    """Params shared by all the tests of an encoder"""
 
     encoder: Encoder
-    asset: Tuple[str, Asset]
     vmaf_binary: Path
     resources_dir: str
     output_dir: str
@@ -63,11 +67,17 @@ class Result:
 
     asset_fname: Optional[str] = None
     encoder_name: Optional[str] = None
-    encode_time: float = 0.0
+    encode_time_ns: int = 0
     encode_result: EncodeTestResult = EncodeTestResult.NOT_RUN
     vmaf_result: EncodeTestResult = EncodeTestResult.NOT_RUN
     vmaf_score: float = 0.0
-    vmaf_time: float = 0.0
+    vmaf_time_ns: int = 0
+
+    @property
+    def failed(self) -> bool:
+        """Whether the encode or the VMAF computation did not succeed"""
+        return (self.encode_result is not EncodeTestResult.SUCCESS
+                or self.vmaf_result is not EncodeTestResult.SUCCESS)
 
     def __str__(self):
         s = f'{self.encoder_name} — {self.asset_fname} '
@@ -75,7 +85,7 @@ class Result:
             return f'{s} → Encode {self.encode_result.value}'
         if self.vmaf_result is not EncodeTestResult.SUCCESS:
             return f'{s} → VMAF {self.vmaf_result.value}'
-        time = self.encode_time + self.vmaf_time
+        time = (self.encode_time_ns + self.vmaf_time_ns) / 1e9
         return f'{s} [{time:.3f}s] → {self.vmaf_score:.5f}'
 
 
@@ -84,70 +94,108 @@ class Test:  # pylint: disable=too-few-public-methods
 
     def __init__(self, params: Params):
         self.params = params
-
-    def run(self, result: Result) -> None:
-        """Run the test"""
-
-        output_filepath = os.path.join(
-            self.params.output_dir,
-            self.params.asset[1].name + ".y4m"
-        )
-        input_filepath = os.path.join(
-            self.params.resources_dir,
-            self.params.asset[0],
-            self.params.asset[1].filename,
-        )
-        output_filepath = normalize_path(output_filepath)
-        input_filepath = normalize_path(input_filepath)
-
-        result.asset_fname = self.params.asset[1].filename
+        self.output_dir = normalize_path(params.output_dir)
+        # Pipe the encoded stream to VMAF instead of going through disk,
+        # unless the user wants to keep the encoded files
+        self.streamed = (params.encoder.supports_stdout
+                         and not params.keep_files
+                         and os.path.exists('/dev/stdin'))
+
+    def _vmaf_cmd(self, asset: Asset, distorted: str) -> List[str]:
+        return [
+            str(self.params.vmaf_binary),
+            '--quiet',
+            '--reference',
+            asset.path,
+            '--distorted',
+            distorted,
+        ]
+
+    @staticmethod
+    def _parse_vmaf(result: Result, output: str) -> None:
+        match = VMAF_SCORE_RE.search(output)
+        if match:
+            result.vmaf_score = float(match.group(1))
+            result.vmaf_result = EncodeTestResult.SUCCESS
+        else:
+            result.vmaf_result = EncodeTestResult.FAIL
+
+    def run(self, asset: Asset, result: Result) -> None:
+        """Run the test for an asset"""
+
+        result.asset_fname = asset.filename
         result.encoder_name = self.params.encoder.name()
 
+        if self.streamed:
+            self._run_streamed(asset, result)
+        else:
+            self._run_with_file(asset, result)
+
+    def _run_streamed(self, asset: Asset, result: Result) -> None:
+        """Encode and compute VMAF in a single pipeline. Both run
+        concurrently, so the encode time accounts for both, though the
+        timeout only bounds the encode. An encode killed by the broken pipe
+        when VMAF exits early, or failing along with VMAF, shows as a VMAF
+        failure"""
         try:
-            start = perf_counter()
+            start = perf_counter_ns()
+            output = run_piped_commands(
+                self.params.encoder.encode_cmd(asset.path),
+                self._vmaf_cmd(asset, '/dev/stdin'),
+                verbose=self.params.verbose,
+                timeout=self.params.timeout,
+            )
+            result.encode_time_ns = perf_counter_ns() - start
+        except TimeoutExpired:
+            result.encode_result = EncodeTestResult.TIMEOUT
+            raise
+        except:  # noqa: E722
+            result.encode_result = EncodeTestResult.ERROR
+            raise
+        result.encode_result = EncodeTestResult.SUCCESS
+
+        self._parse_vmaf(result, output)
+
+    def _run_with_file(self, asset: Asset, result: Result) -> None:
+        """Encode to a file and then compute VMAF from it"""
+
+        output_filepath = f'{self.output_dir}/{asset.name}.y4m'
+        input_filepath = asset.path
+
+        try:
+            start = perf_counter_ns()
             self.params.encoder.encode(
                 input_filepath,
                 output_filepath,
                 self.params.timeout,
                 self.params.verbose,
             )
-            result.encode_time = perf_counter() - start
+            result.encode_time_ns = perf_counter_ns() - start
         except TimeoutExpired:
             result.encode_result = EncodeTestResult.TIMEOUT
             raise
         except:  # noqa: E722
             result.encode_result = EncodeTestResult.ERROR
             raise
-        finally:
-            result.encode_result = EncodeTestResult.SUCCESS
-
-        if result.encode_result is EncodeTestResult.SUCCESS:
-            cmd = [
-                str(self.params.vmaf_binary),
-                '--quiet',
-                '--reference',
-                input_filepath,
-                '--distorted',
-                output_filepath
-            ]
+        result.encode_result = EncodeTestResult.SUCCESS
+
+        try:
+            start = perf_counter_ns()
+            # A failing vmaf is reported by the missing score
+            output = run_command_with_output(
+                command=self._vmaf_cmd(asset, output_filepath),
+                verbose=self.params.verbose,
+                check=False,
+            )
+            result.vmaf_time_ns = perf_counter_ns() - start
+        except:  # noqa: E722
+            result.vmaf_result = EncodeTestResult.ERROR
+            raise
+
+        self._parse_vmaf(result, output)
+
+        if not self.params.keep_files:
             try:
-                start = perf_counter()
-                output = run_command_with_output(
-                    command=cmd,
-                    verbose=self.params.verbose,
-                )
-                result.vmaf_time = perf_counter() - start
-            except:  # noqa: E722
-                result.vmaf_result = EncodeTestResult.ERROR
-                raise
-            finally:
-                try:
-                    result.vmaf_score = float(output.split(':')[1])
-                    result.vmaf_result = EncodeTestResult.SUCCESS
-                except (IndexError, ValueError):
-                    result.vmaf_result = EncodeTestResult.FAIL
-
-        if not self.params.keep_files \
-           and os.path.exists(output_filepath) \
-           and os.path.isfile(output_filepath):
-            os.remove(output_filepath)
+                os.remove(output_filepath)
+            except (FileNotFoundError, IsADirectoryError):
+                pass
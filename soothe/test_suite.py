@@ -20,13 +20,21 @@
 """Test Suite - a set of tests"""
 
 import os
-
-from dataclasses import dataclass
-from multiprocessing import Pool
+import signal
+import sys
+import traceback
+
+from dataclasses import dataclass, replace
+from multiprocessing import (TimeoutError as PoolTimeoutError,
+                             get_all_start_methods, get_context)
+from multiprocessing.context import BaseContext
 from pathlib import Path
 from shutil import rmtree
+from tempfile import mkdtemp
+from queue import SimpleQueue
+from threading import Event, Thread
 from time import perf_counter
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 from .asset import Asset
 from .encoder import Encoder
@@ -49,6 +57,51 @@ class Params:  # pylint: disable=too-many-instance-attributes
     verbose: bool = False
 
 
+# Params of the suite, set in each worker by the pool initializer so they
+# are not sent along with every test
+TEST_CONTEXT: Optional[Params] = None
+# Set by the suite to cancel the tests not started yet
+STOP_EVENT: Optional[Any] = None
+# Tests of the worker, by encoder class and output directory
+_WORKER_TESTS: Dict[Tuple[Type[Encoder], str], Test] = {}
+
+
+def _init_worker(context: Params, stop_event: Any) -> None:
+    global TEST_CONTEXT, STOP_EVENT  # pylint: disable=global-statement
+    TEST_CONTEXT = context
+    STOP_EVENT = stop_event
+    # Interruptions are handled by the suite, which terminates the pool.
+    # Commands run in sessions of their own, so unwind to kill them then
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _exit_worker)
+
+
+def _exit_worker(*_: Any) -> None:
+    # Only once, so the unwinding isn't interrupted
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    sys.exit(1)
+
+
+def _worker_test(encoder_cls: Type[Encoder], output_dir: str) -> Test:
+    # Encoders are sent by class, which pickles as a reference, and
+    # instantiated once per worker
+    key = (encoder_cls, output_dir)
+    test = _WORKER_TESTS.get(key)
+    if test is None:
+        assert TEST_CONTEXT
+        test = Test(TestParams(
+            encoder=encoder_cls(),
+            vmaf_binary=TEST_CONTEXT.vmaf_binary,
+            resources_dir=TEST_CONTEXT.resources_dir,
+            output_dir=output_dir,
+            timeout=TEST_CONTEXT.timeout,
+            keep_files=TEST_CONTEXT.keep_files,
+            verbose=TEST_CONTEXT.verbose,
+        ))
+        _WORKER_TESTS[key] = test
+    return test
+
+
 class TestSuite:  # pylint: disable=too-few-public-methods
     """
     Test suite class.
@@ -58,74 +111,141 @@ class TestSuite:  # pylint: disable=too-few-public-methods
     def __init__(self, params: Params):
         self.params = params
         self.output_dir = os.path.join(params.output_dir, params.name)
-        self.time = 0.0
-        self.num_results = 0
-
-    def _generate_tests(self, encoder: Encoder) -> List[Test]:
-        tests = []
-        for asset in self.params.assets:
-            tests.append(
-                Test(TestParams(
-                    encoder=encoder,
-                    asset=asset,
-                    vmaf_binary=self.params.vmaf_binary,
-                    resources_dir=self.params.resources_dir,
-                    output_dir=self.params.output_dir,
-                    timeout=self.params.timeout,
-                    keep_files=self.params.keep_files,
-                    verbose=self.params.verbose,
-                ))
-            )
-
-        return tests
-
-    def _run_worker(self, test: Test) -> TestResult:
-        """Run one test"""
+        # The forkserver starts the workers from a small process with this
+        # module preloaded, instead of forking this one with all its threads
+        ctx: BaseContext
+        if 'forkserver' in get_all_start_methods():
+            ctx = get_context('forkserver')
+            ctx.set_forkserver_preload([__name__])
+        else:
+            ctx = get_context()
+        # Set when fail_fast stops the suite, shared by all its runs and the
+        # workers, which skip the pending tests instead of being terminated
+        self.stop_event = ctx.Event()
+        # Set when the pool is terminated, so the runs stop waiting for it
+        self._terminated = Event()
+        # Shared by all the runs, so the workers are started only once
+        self._pool = ctx.Pool(
+            params.jobs,
+            initializer=_init_worker,
+            initargs=(replace(params, assets=[]), self.stop_event),
+        )
+        # Output of the concurrent runs goes through a single thread, so it
+        # does not interleave or hold up the runs
+        self._output: SimpleQueue = SimpleQueue()
+        self._printer = Thread(target=self._print_output, daemon=True)
+        self._printer.start()
+
+    def _print_output(self) -> None:
+        for line in iter(self._output.get, None):
+            print(line, flush=True)
+
+    def close(self, terminate: bool = False) -> None:
+        """Shut down the workers, once all the runs are done. terminate
+        kills them instead, ie. when the runs were interrupted"""
+        if terminate:
+            self.stop_event.set()
+            self._terminated.set()
+            self._pool.terminate()
+        else:
+            self._pool.close()
+        self._pool.join()
+        self._output.put(None)
+        self._printer.join()
+
+    @staticmethod
+    def _run_worker(
+            task: Tuple[Type[Encoder], str, Asset],
+    ) -> Optional[TestResult]:
+        """Run one test, or none if the suite was stopped"""
+        assert STOP_EVENT
+        if STOP_EVENT.is_set():
+            return None
+        (encoder_cls, output_dir, asset) = task
+        test = _worker_test(encoder_cls, output_dir)
         test_result = TestResult()
-        test.run(test_result)
+        try:
+            test.run(asset, test_result)
+        except Exception:  # pylint: disable=broad-except
+            # The failure is recorded in the result, and raising would stop
+            # the whole suite
+            if test.params.verbose:
+                traceback.print_exc()
         return test_result
 
-    def _run_test_suite_in_parallel(self, tests: List[Test]) -> None:
-        """Run the tests suite in parallel"""
-
-        test_results: List[TestResult] = []
-        with Pool(self.params.jobs) as pool:
-
-            def _callback(test_result: TestResult) -> None:
-                print(test_result, flush=True)
-                if self.params.fail_fast:
-                    pool.terminate()
-                test_results.append(test_result)
-
-            start = perf_counter()
-            for test in tests:
-                pool.apply_async(self._run_worker, (test,), callback=_callback)
-
-            pool.close()
-            pool.join()
+    def _run_test_suite_in_parallel(
+            self,
+            encoder: Encoder,
+            output_dir: str,
+    ) -> Tuple[int, float]:
+        """
+        Run the tests suite in parallel.
+        Returns the number of results and the time taken
+        """
 
-        self.time = perf_counter() - start
-        self.num_results = len(test_results)
+        num_results = 0
+        tasks = [(type(encoder), output_dir, asset)
+                 for (_, asset) in self.params.assets]
+
+        start = perf_counter()
+        # When stopping, the tests already running finish and the rest come
+        # back quickly as None. With chunksize=1 this is the pool iterator
+        # itself, not a generator over chunks, so its next() takes a timeout
+        # to keep checking whether the pool was terminated
+        test_results = self._pool.imap_unordered(
+            self._run_worker, tasks, chunksize=1)
+        while not self._terminated.is_set():
+            try:
+                test_result = test_results.next(timeout=0.5)
+            except StopIteration:
+                break
+            except PoolTimeoutError:
+                continue
+            if test_result is None:
+                continue
+            self._output.put(test_result)
+            num_results += 1
+            if self.params.fail_fast and test_result.failed:
+                self.stop_event.set()
+
+        return (num_results, perf_counter() - start)
 
     def run(self, encoder: Encoder) -> None:
         """
-        Run the test suite.
-        Returns a new copy of the test suite with results of the test
+        Run the test suite for an encoder.
+        It can be called concurrently for different encoders
         """
 
-        if not encoder.check(self.params.verbose):
-            print(f'Skipping encoder {encoder.name} because it cannot run')
+        if self.stop_event.is_set():
             return
 
-        self.params.output_dir = os.path.join(self.params.output_dir,
-                                              self.params.name)
-        if os.path.exists(self.params.output_dir):
-            rmtree(self.params.output_dir)
-        os.makedirs(self.params.output_dir)
-
-        tests = self._generate_tests(encoder)
+        if not encoder.check(self.params.verbose):
+            self._output.put(
+                f'Skipping encoder {encoder.name()} because it cannot run')
+            return
 
-        print(f'Running {self.params.name} [{len(tests)} tests] for encoder '
-              f'{encoder.name()}')
-        self._run_test_suite_in_parallel(tests)
-        print(f'Ran {self.num_results} tests in {self.time:.3f} secs\n')
+        if self.params.keep_files:
+            output_dir = os.path.join(self.output_dir, encoder.name())
+            if os.path.exists(output_dir):
+                rmtree(output_dir)
+            os.makedirs(output_dir)
+        else:
+            # A directory of its own for this run. Each test removes its
+            # output, so disk usage doesn't grow with the number of assets,
+            # and removing it at the end takes whatever is left behind
+            os.makedirs(self.output_dir, exist_ok=True)
+            output_dir = mkdtemp(prefix=f'{encoder.name()}-',
+                                 dir=self.output_dir)
+
+        self._output.put(
+            f'Running {self.params.name} [{len(self.params.assets)} tests] '
+            f'for encoder {encoder.name()}')
+        try:
+            (num_results, time) = self._run_test_suite_in_parallel(
+                encoder, output_dir)
+        finally:
+            if not self.params.keep_files:
+                rmtree(output_dir, ignore_errors=True)
+        self._output.put(
+            f'Ran {num_results} tests for encoder {encoder.name()} in '
+            f'{time:.3f} secs\n')
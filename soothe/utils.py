@@ -20,55 +20,247 @@
 
 """Utilities module"""
 
+import codecs
+import errno
 import hashlib
+import json
+import mmap
 import os
 import platform
 import random
+import select
 import shutil
+import signal
 import subprocess
 import time
 import urllib.request
 import sys
 
 from abc import abstractmethod, ABC
+from functools import lru_cache
 from pty import openpty
 from threading import Lock
-from typing import Any, List, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-download_lock = Lock()
+try:
+    # pylint: disable-next=import-error
+    import blake3  # type: ignore[import-not-found]
+except ImportError:
+    blake3 = None  # type: ignore
 
+# Checked once, instead of going through platform.system() on each call
+_IS_WINDOWS = platform.system() == "Windows"
 
-def download(url: str, dest_dir: str, max_retries: int = 5) -> None:
-    """Downloads a file to a directory with a mutex lock to avoid conflicts and
-    retries with exponential backoff"""
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+CHECKSUM_CHUNK_SIZE = 1 << 20
+# Files bigger than this are memory mapped to be hashed
+CHECKSUM_MMAP_MIN_SIZE = 64 << 20
+# How often the producer of piped commands is checked while reading
+PIPE_POLL_INTERVAL = 0.1
+
+# Hash algorithm by hex digest length
+CHECKSUM_ALGORITHMS = {32: 'md5', 40: 'sha1', 64: 'sha256'}
+
+
+def download_and_hash(
+        url: str,
+        dest_path: str,
+        algo: str = 'md5',
+        max_retries: int = 5,
+) -> str:
+    """Downloads a file to dest_path and returns its checksum, hashing the data
+    while it is received so the file doesn't need to be read back"""
     for attempt in range(max_retries):
-        done = False
         try:
-            with download_lock:
-                with urllib.request.urlopen(url) as response:
-                    dest_path = os.path.join(dest_dir, url.split('/')[-1])
-                    with open(dest_path, 'wb') as dest:
-                        shutil.copyfileobj(response, dest)
-            done = True
+            with urllib.request.urlopen(url) as response, \
+                    open(dest_path, 'wb') as dest:
+                digest = new_hash(algo)
+                # The data has to be hashed, so it can't be spliced to the
+                # file; at least read it into a single reused buffer
+                buf = memoryview(bytearray(DOWNLOAD_CHUNK_SIZE))
+                size = response.readinto(buf)
+                while size:
+                    dest.write(buf[:size])
+                    digest.update(buf[:size])
+                    size = response.readinto(buf)
+                dest.flush()
+                drop_page_cache(dest.fileno())
+            return digest.hexdigest()
         except urllib.error.URLError as ex:
             if attempt < max_retries - 1:
                 wait_time = random.uniform(1, 2**attempt)
                 time.sleep(wait_time)
             else:
                 raise urllib.error.URLError(reason=ex.reason) from ex
-        if done:
-            break
+    raise urllib.error.URLError(reason=f'{url}: no download attempts')
+
+
+def drop_page_cache(fd: int) -> None:
+    """Flush a file to disk and advise the kernel to drop it from the page
+    cache, so big assets don't evict everything else from memory"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    os.fsync(fd)
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def parse_checksum(checksum: str) -> Tuple[str, str]:
+    """Split a checksum in its hash algorithm and hex digest. The algorithm is
+    either given as a prefix, ie. "blake3:<digest>", or guessed from the
+    length of the digest"""
+    (algo, sep, digest) = checksum.partition(':')
+    if sep:
+        return (algo.lower(), digest.lower())
+    return (CHECKSUM_ALGORITHMS.get(len(checksum), 'md5'), checksum)
+
+
+def new_hash(algo: str, threaded: bool = False) -> Any:
+    """Create a hash object, letting OpenSSL pick its fastest implementation
+    since checksums are only used to verify the content. With threaded,
+    blake3 splits the hashing of large inputs among all the CPUs"""
+    if algo == 'blake3':
+        if blake3 is None:
+            raise ValueError('blake3 checksums need the blake3 module')
+        return blake3.blake3(
+            max_threads=blake3.blake3.AUTO if threaded else 1)
+    return hashlib.new(algo, usedforsecurity=False)
+
+
+def file_checksum(path: str, algo: str = 'md5') -> str:
+    """Calculates checksum of a file, memory mapping it if it's large or
+    reading it in chunks otherwise"""
+    # Unbuffered, since it is read in big chunks
+    with open(path, 'rb', buffering=0) as f:
+        large = os.fstat(f.fileno()).st_size > CHECKSUM_MMAP_MIN_SIZE
+        digest = new_hash(algo, threaded=large)
+        if large:
+            if hasattr(digest, 'update_mmap'):
+                # blake3 maps the file itself, and hashes it with a thread
+                # per CPU since its tree allows it
+                digest.update_mmap(path)
+                return str(digest.hexdigest())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                digest.update(mm)
+        elif hasattr(hashlib, 'file_digest'):
+            # Python >= 3.11: reads into a single reused buffer
+            digest = hashlib.file_digest(f, lambda: new_hash(algo))
+        else:
+            buf = memoryview(bytearray(CHECKSUM_CHUNK_SIZE))
+            size = f.readinto(buf)
+            while size:
+                digest.update(buf[:size])
+                size = f.readinto(buf)
+    return str(digest.hexdigest())
+
+
+class ChecksumCache:
+    """
+    Cache of file checksums keyed by real path, modification time, size and
+    algorithm, persisted as a JSON file so unchanged files aren't hashed
+    again
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.entries: Dict[str, List[Any]] = {}
+        self.dirty = False
+        self.lock = Lock()
+        try:
+            with open(filename, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def checksum(self, path: str, algo: str = 'md5') -> str:
+        """Return the checksum of path, calculating it only if the file
+        changed since it was stored"""
+        # The real path, so a file reached through symlinks is hashed once
+        key = os.path.realpath(path)
+        stat = os.stat(key)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[:3] == [stat.st_mtime_ns, stat.st_size, algo]:
+            return str(entry[3])
+        checksum = file_checksum(key, algo)
+        # Stored with the stat taken before hashing, so a file modified
+        # meanwhile is hashed again next time
+        self._store(key, stat, algo, checksum)
+        return checksum
 
+    def update(self, path: str, checksum: str, algo: str = 'md5') -> None:
+        """Store the checksum of path for its current modification time"""
+        key = os.path.realpath(path)
+        self._store(key, os.stat(key), algo, checksum)
 
-def file_checksum(path: str) -> str:
-    """Calculates checksum of a file reading chunks of 64K"""
-    md5 = hashlib.md5()
-    with open(path, 'rb') as f:
-        chunk = f.read(65536)
-        while chunk:
-            md5.update(chunk)
-            chunk = f.read(65536)
-    return md5.hexdigest()
+    def _store(
+            self,
+            key: str,
+            stat: os.stat_result,
+            algo: str,
+            checksum: str,
+    ) -> None:
+        with self.lock:
+            self.entries[key] = [
+                stat.st_mtime_ns, stat.st_size, algo, checksum
+            ]
+            self.dirty = True
+
+    def save(self) -> None:
+        """Write the cache to disk atomically if anything changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp_filename = f'{self.filename}.tmp'
+            try:
+                with open(tmp_filename, 'w', encoding='utf-8') as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp_filename, self.filename)
+                self.dirty = False
+            except OSError as ex:
+                print(f'Unable to store checksums cache {self.filename}: '
+                      f'{ex}')
+
+
+def copy_file(src: str, dst: str) -> None:
+    """Copies src to dst without passing the data through user space: with
+    copy_file_range(), which lets filesystems share the data (reflink), or
+    with shutil.copyfile() (sendfile() on Linux) if it isn't supported"""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(),
+                                                remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            return
+        except OSError as ex:
+            if ex.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                errno.EOPNOTSUPP):
+                raise
+    shutil.copyfile(src, dst)
+
+
+def cache_dir() -> str:
+    """Return the directory where soothe caches data between runs"""
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'soothe')
+
+
+def kill_process_group(proc: subprocess.Popen) -> None:
+    """Kill a process started in a new session along with its children"""
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        proc.kill()
 
 
 def run_command(
@@ -85,73 +277,260 @@ def run_command(
         print(f'Running command "{" ".join(command)}"')
 
     try:
-        subprocess.run(
+        # Run the command in its own session so, on timeout or interruption,
+        # any process it spawned is killed too
+        with subprocess.Popen(
             command,
             stdout=out,
             stderr=err,
-            check=check,
-            timeout=timeout)
+            start_new_session=True,
+        ) as proc:
+            try:
+                proc.wait(timeout=timeout)
+            except BaseException:
+                kill_process_group(proc)
+                raise
+        if check and proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, command)
     except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as ex:
         # Developer experience improvement (facilitates copy/paste)
         ex.cmd = " ".join(ex.cmd)
         raise ex
 
 
+def _read_output(
+        proc: subprocess.Popen,
+        fd: int,
+        verbose: bool,
+        timeout: Optional[int],
+) -> str:
+    """Reads the output of proc from fd as it's produced, until the command
+    closes it, showing it if verbose"""
+    # Drain everything available on each wakeup, decoding only at the end
+    # unless the output is shown as it comes
+    os.set_blocking(fd, False)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    output = bytearray()
+    deadline = None
+    if timeout is not None:
+        limit = timeout
+        deadline = time.monotonic() + limit
+    while True:
+        wait = None if deadline is None else deadline - time.monotonic()
+        if wait is not None and wait <= 0:
+            raise subprocess.TimeoutExpired(
+                proc.args, limit,
+                output=output.decode('utf-8', errors='replace'))
+        ready, _, _ = select.select([fd], [], [], wait)
+        if not ready:
+            continue
+        try:
+            while True:
+                data = os.read(fd, 65536)
+                if not data:
+                    break
+                output += data
+                if verbose:
+                    print(decoder.decode(data), end='', flush=True)
+        except BlockingIOError:
+            continue
+        except OSError:
+            # EIO: the command closed the pty (a pipe just returns EOF)
+            pass
+        if verbose:
+            print(decoder.decode(b'', final=True), end='', flush=True)
+        return output.decode('utf-8', errors='replace')
+
+
 def run_command_with_output(
         command: List[str],
         verbose: bool = False,
         check: bool = True,
         timeout: Optional[int] = None,
+        tty: bool = False,
 ) -> str:
-    """Runs a command and returns std output trace"""
+    """Runs a command and returns std output trace. With tty the command
+    writes to a pseudo-terminal, for the ones behaving differently
+    otherwise, instead of to a pipe"""
     if verbose:
         print(f'Runnig command "{" ".join(command)}"')
 
-    m_fd, s_fd = openpty()
+    if tty:
+        m_fd, s_fd = openpty()
+    else:
+        m_fd, s_fd = os.pipe()
     try:
         with subprocess.Popen(
             command,
             stderr=s_fd,
             stdout=s_fd,
+            start_new_session=True,
         ) as proc:
-            proc.communicate(timeout=timeout)
-
-        out = os.read(m_fd, 1024).decode('utf-8').strip()
+            # Only the command keeps the write side open, so reading the
+            # other side ends when the command exits
+            os.close(s_fd)
+            s_fd = -1
+            try:
+                out = _read_output(proc, m_fd, verbose, timeout).strip()
+                proc.wait()
+            except BaseException:
+                kill_process_group(proc)
+                raise
+        if check and proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, command,
+                                                output=out)
+        return out
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as ex:
+        # Developer experience improvement (facilitates copy/paste)
+        ex.cmd = " ".join(ex.cmd)
+        raise ex
+    finally:
         os.close(m_fd)
-        os.close(s_fd)
+        if s_fd >= 0:
+            os.close(s_fd)
 
-        if verbose and out:
-            print(out)
 
-        return out or ""
-    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as ex:
-        if verbose and ex.output:
-            # Workaround inconsistent Python implementation
-            if isinstance(ex, subprocess.TimeoutExpired):
-                print(ex.output)
-            else:
-                print(ex.output)
+def cpu_count() -> int:
+    """Number of CPUs the process is allowed to run on, which might be less
+    than the ones in the system, ie. in containers or with taskset"""
+    if hasattr(os, 'process_cpu_count'):
+        count = os.process_cpu_count()
+    elif hasattr(os, 'sched_getaffinity'):
+        count = len(os.sched_getaffinity(0))
+    else:
+        count = os.cpu_count()
+    return count or 1
+
+
+def _read_piped_output(
+        prod: subprocess.Popen,
+        fd: int,
+        timeout: Optional[int],
+) -> str:
+    """Reads from fd the output of the consumer of prod until it closes it
+    and prod exits, which must happen before timeout"""
+    os.set_blocking(fd, False)
+    output = bytearray()
+    deadline = None
+    if timeout is not None:
+        limit = timeout
+        deadline = time.monotonic() + limit
+    while True:
+        # Once prod exits only the consumer is left, which isn't bounded
+        wait = None
+        if prod.poll() is None:
+            wait = PIPE_POLL_INTERVAL
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise subprocess.TimeoutExpired(
+                        prod.args, limit,
+                        output=output.decode('utf-8', errors='replace'))
+                wait = min(wait, left)
+        ready, _, _ = select.select([fd], [], [], wait)
+        if not ready:
+            continue
+        try:
+            while True:
+                data = os.read(fd, 65536)
+                if not data:
+                    break
+                output += data
+        except BlockingIOError:
+            continue
+        break
 
-        if isinstance(ex, subprocess.CalledProcessError) and not check:
-            return ex.output or ""
+    try:
+        prod.wait(timeout=None if deadline is None else
+                  max(0.0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        raise subprocess.TimeoutExpired(
+            prod.args, limit,
+            output=output.decode('utf-8', errors='replace')) from None
+    return output.decode('utf-8', errors='replace')
+
+
+def run_piped_commands(
+        producer: List[str],
+        consumer: List[str],
+        verbose: bool = False,
+        check: bool = True,
+        timeout: Optional[int] = None,
+) -> str:
+    """Runs producer with its stdout piped to the stdin of consumer and
+    returns the output of consumer. timeout and check only apply to producer,
+    the latter unless producer is killed by the broken pipe or consumer fails,
+    as then the consumer failure shows in its output"""
+    if verbose:
+        print(f'Running command "{" ".join(producer)} | '
+              f'{" ".join(consumer)}"')
 
+    err = subprocess.DEVNULL if not verbose else None
+    try:
+        with subprocess.Popen(
+            producer,
+            stdout=subprocess.PIPE,
+            stderr=err,
+            start_new_session=True,
+        ) as prod:
+            try:
+                with subprocess.Popen(
+                    consumer,
+                    stdin=prod.stdout,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=True,
+                ) as cons:
+                    # Only the consumer reads the pipe, so the producer
+                    # gets SIGPIPE if the consumer exits early
+                    assert prod.stdout and cons.stdout
+                    prod.stdout.close()
+                    try:
+                        output = _read_piped_output(
+                            prod, cons.stdout.fileno(), timeout)
+                        cons.wait()
+                    except BaseException:
+                        kill_process_group(cons)
+                        raise
+            except BaseException:
+                kill_process_group(prod)
+                raise
+        output = output.strip()
+        if verbose and output:
+            print(output)
+        # Exiting early, the consumer makes the producer fail
+        consumer_failed = (prod.returncode == -signal.SIGPIPE
+                           or cons.returncode != 0)
+        if check and prod.returncode and not consumer_failed:
+            raise subprocess.CalledProcessError(prod.returncode, producer,
+                                                output=output)
+        return output
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as ex:
         # Developer experience improvement (facilitates copy/paste)
         ex.cmd = " ".join(ex.cmd)
         raise ex
 
 
+@lru_cache(maxsize=256)
 def normalize_binary_cmd(cmd: str) -> str:
     """Return the OS-form binary"""
-    if platform.system() == "Windows":
+    if _IS_WINDOWS:
         return cmd if cmd.endswith(".exe") else cmd + ".exe"
     if cmd.endswith(".exe"):
         return cmd.replace(".exe", "")
     return cmd
 
 
+def resolve_binary_cmd(cmd: str) -> str:
+    """Return the full path of the OS-form binary, or the binary itself if
+    it isn't found in PATH"""
+    cmd = normalize_binary_cmd(cmd)
+    return shutil.which(cmd) or cmd
+
+
 def normalize_path(path: str) -> str:
     """Normalize the path to make it Unix-like"""
-    if platform.system() == "Windows":
+    if _IS_WINDOWS:
         return path.replace("\\", "/")
     return path
 
@@ -175,11 +554,10 @@ def get_matches_from_list(
     """
     if in_list:
         in_list_names = {x.lower() for x in in_list}
-        check_list_names = {x.name().lower() for x in check_list}
-        matches = in_list_names & check_list_names
-        if len(matches) != len(in_list):
-            sys.exit(f"No {name} found for: "
-                     f"{', '.join(in_list_names - check_list_names)}")
+        by_name = {x.name().lower(): x for x in check_list}
+        missing = in_list_names - by_name.keys()
+        if missing:
+            sys.exit(f"No {name} found for: {', '.join(missing)}")
 
-        return [x for x in check_list if x.name().lower() in matches]
+        return [x for (n, x) in by_name.items() if n in in_list_names]
     return check_list